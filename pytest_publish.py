@@ -1,26 +1,97 @@
 from __future__ import annotations
 
+import gzip
 import json
-import math
 import os
+import queue
+import threading
+import time
 import traceback
+import warnings
+from collections import Counter
 from dataclasses import dataclass
 
+import orjson
 import requests
-from dataclasses_json import dataclass_json
-from filelock import FileLock
-from pytest import CallInfo, Config, Item, Parser, TestReport, hookimpl, skip
+from pytest import (
+    CallInfo,
+    Config,
+    Item,
+    Parser,
+    PytestWarning,
+    Session,
+    TestReport,
+    hookimpl,
+    skip,
+)
+from requests.adapters import HTTPAdapter, Retry
+
+try:
+    from xdist.scheduler.loadgroup import LoadGroupScheduling
+
+    _split_scope = LoadGroupScheduling._split_scope
+except ImportError:
+    _split_scope = None
+
+# Options are cached in pytest_configure to keep getoption() off the per-test path
+_PUBLISH_URL: str | None = None
+_PUBLISH_BATCH = 1
+_PUBLISH_GZIP = False
+_PUBDIR_PATH: str | None = None
+_PUBDIR_FILTER = "bad"
+_XDIST_WORKER: str | None = None
+_XDIST_DIST: str | None = None
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_GZIP_JSON_HEADERS = {**_JSON_HEADERS, "Content-Encoding": "gzip"}
+_PUBLISH_TIMEOUT = 5
+
+# Shared across all --publish POSTs so connections are kept alive between tests
+_session = requests.Session()
+for _prefix in ("http://", "https://"):
+    _session.mount(
+        _prefix,
+        HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.1),
+        ),
+    )
+
+# Serialized results waiting to be posted (only with --publish-batch > 1)
+_PUBLISH_FLUSH_INTERVAL = 1.0
+_pending: list[bytes] = []
+_last_flush = time.monotonic()
+
+# Request bodies are posted by a background thread, off the test's critical path
+_PUBLISH_DRAIN_TIMEOUT = 30
+_queue: queue.Queue[bytes | None] = queue.Queue()
+_thread: threading.Thread | None = None
+_publish_error: Exception | None = None
+
+# Per-process test index for --pubdir, keyed by (xdist_scope, test_name)
+_counts: dict[tuple[str, str], int] = {}
+
+# Directories already created under --pubdir by this process
+_mkdir_cache: set[str] = set()
+
+# Captures are cut to their tail beyond this size (full text kept with --pubdir)
+_INLINE_CAP = 64 * 1024
+
+# Number of collected tests sharing each short name (only with --pubdir)
+_short_name_counts: Counter[str] = Counter()
 
 
-@dataclass_json
 @dataclass
 class TestResult:
-    @dataclass_json
     @dataclass
     class ExcInfo:
         type: str
         value: str
-        traceback: list[str]
+        traceback: str
+
+        def _to_payload(self) -> dict:
+            return {"type": self.type, "value": self.value, "traceback": self.traceback}
 
     type: str
     result: str  # "pass", "skip", "fail"
@@ -38,6 +109,25 @@ class TestResult:
     pubdir_path: str | None  # only with --pubdir
     excinfo: ExcInfo | None = None  # only if "skip" or "fail"
 
+    def _to_payload(self) -> dict:
+        return {
+            "type": self.type,
+            "result": self.result,
+            "nodeid": self.nodeid,
+            "name": self.name,
+            "start_time": self.start_time,
+            "stop_time": self.stop_time,
+            "duration": self.duration,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "log": self.log,
+            "xdist_dist": self.xdist_dist,
+            "xdist_worker": self.xdist_worker,
+            "xdist_scope": self.xdist_scope,
+            "pubdir_path": self.pubdir_path,
+            "excinfo": self.excinfo._to_payload() if self.excinfo else None,
+        }
+
 
 @hookimpl()
 def pytest_addoption(parser: Parser):
@@ -48,6 +138,21 @@ def pytest_addoption(parser: Parser):
         help="url to post test results",
     )
 
+    parser.addoption(
+        "--publish-batch",
+        metavar="size",
+        action="store",
+        type=int,
+        default=1,
+        help="number of test results to post together as a json array",
+    )
+
+    parser.addoption(
+        "--publish-gzip",
+        action="store_true",
+        help="gzip-compress posted test results (Content-Encoding: gzip)",
+    )
+
     parser.addoption(
         "--pubdir",
         metavar="path",
@@ -64,68 +169,125 @@ def pytest_addoption(parser: Parser):
     )
 
 
+def _first_free_index(test_dir: str, worker: str) -> int:
+    # continue after the results of earlier runs into the same --pubdir
+    try:
+        entries = os.listdir(test_dir)
+    except FileNotFoundError:
+        return 0
+
+    last = -1
+    for entry in entries:
+        index, _, rest = entry.partition(".")
+        if index.isdigit() and rest.partition(".")[0] == worker:
+            last = max(last, int(index))
+    return last + 1
+
+
 def generate_test_pubdir_path(
-    pubdir_path: str, test_name: str, result: str, xdist_scope: str | None
+    pubdir_path: str,
+    test_name: str,
+    result: str,
+    xdist_scope: str | None,
+    xdist_worker: str | None,
 ):
     if xdist_scope:
-        pubdir_path = os.path.join(pubdir_path, xdist_scope)
-    # TODO: dual test names
-    pubdir_path = os.path.join(pubdir_path, test_name)
-
-    # Get unique test index (with filelock to support parallel execution of test)
-    count = 0
-    os.makedirs(pubdir_path, exist_ok=True)
-    count_file = os.path.join(pubdir_path, "count")
-    with FileLock(os.path.join(pubdir_path, ".lock")):
-        if os.path.exists(count_file):
-            with open(count_file, "r") as r:
-                count_str = r.read().strip()
-                if count_str.isdigit():
-                    count = int(count_str)
-        with open(count_file, "w") as w:
-            w.write(str(count + 1))
-
-    return os.path.join(pubdir_path, f"{count}.{result}")
-
-
-def should_pubdir_test(config: Config, result: str) -> bool:
-    pubdir_filter = config.getoption("pubdir_filter")
-    if pubdir_filter == "all":
+        pubdir_path = f"{pubdir_path}{os.sep}{xdist_scope}"
+    pubdir_path = f"{pubdir_path}{os.sep}{test_name}"
+    worker = xdist_worker or "main"
+
+    # Get unique test index (worker id in filename keeps parallel workers apart)
+    key = (xdist_scope or "", test_name)
+    count = _counts.get(key)
+    if count is None:
+        count = _first_free_index(pubdir_path, worker)
+    _counts[key] = count + 1
+
+    return f"{pubdir_path}{os.sep}{count}.{worker}.{result}"
+
+
+def should_pubdir_test(result: str) -> bool:
+    if _PUBDIR_FILTER == "all":
         return True
-    if pubdir_filter == "fail":
+    if _PUBDIR_FILTER == "fail":
         return result == "fail"
     return result != "pass"
 
 
+def get_result(call: CallInfo) -> str:
+    if not call.excinfo:
+        return "pass"
+    return "skip" if call.excinfo.errisinstance(skip.Exception) else "fail"
+
+
+def _ensure_dir(path: str):
+    if path not in _mkdir_cache:
+        os.makedirs(path, exist_ok=True)
+        _mkdir_cache.add(path)
+
+
+def _make_result_dir(test_path: str):
+    # the test directory is shared by all runs of the test, the result one is not
+    _ensure_dir(os.path.dirname(test_path))
+    try:
+        os.mkdir(test_path)
+    except FileExistsError:
+        pass
+
+
+def _cap_capture(text: str, name: str, test_pubdir_path: str | None) -> str:
+    if len(text) <= _INLINE_CAP:
+        return text
+
+    if not test_pubdir_path:
+        return text[-_INLINE_CAP:] + "\n...[truncated]"
+
+    path = f"{test_pubdir_path}{os.sep}{name}.full.txt"
+    _make_result_dir(test_pubdir_path)
+    with open(path, "w", errors="surrogateescape") as w:
+        w.write(text)
+    return text[-_INLINE_CAP:] + f"\n...[truncated; see {path}]"
+
+
+def _qualified_test_name(item: Item, name: str) -> str:
+    path, *scopes = item.nodeid.split("::")
+    # nodeids of tests outside rootdir have no path, fall back to the file name
+    parts = [x for x in path.split("/") if x not in ("", "..")] or [item.path.name]
+    return os.path.join(*parts, *scopes[:-1], name)
+
+
 def create_result(
-    item: Item, call: CallInfo, report: TestReport, pubdir_path: str | None
+    item: Item,
+    call: CallInfo,
+    report: TestReport,
+    result: str,
+    pubdir_path: str | None,
 ) -> TestResult:
-    result = "pass"
-    if call.excinfo:
-        result = "skip" if call.excinfo.errisinstance(skip.Exception) else "fail"
-
     nodeid: str = item.nodeid
-    name: str = nodeid.split("::")[-1]
+    short_name: str = nodeid.split("::")[-1]
+    name = short_name
 
     # xdist-specific
-    xdist_worker = os.environ.get("PYTEST_XDIST_WORKER")
+    xdist_worker = _XDIST_WORKER
     xdist_scope: str | None = None
-    xdist_dist: str | None = None
+    xdist_dist = _XDIST_DIST
     if xdist_worker:
-        xdist_dist = item.config.workerinput["dist"]
-        if xdist_dist == "loadgroup":
-            from xdist.scheduler.loadgroup import LoadGroupScheduling
-
-            xdist_scope = LoadGroupScheduling._split_scope(None, nodeid)
-            name = name[: name.rfind("@")]
+        if xdist_dist == "loadgroup" and _split_scope:
+            xdist_scope = _split_scope(None, nodeid)
+            if xdist_scope != nodeid:  # grouped, strip the "@<group>" suffix
+                name = name.rpartition("@")[0]
 
-    # set destination file in pubdir
+    # set destination file in pubdir (index only advances for written tests)
     test_pubdir_path = None
-    if pubdir_path:
-        # NOTE: always generate so we write to `count` file
-        path = generate_test_pubdir_path(pubdir_path, name, result, xdist_scope)
-        if should_pubdir_test(item.config, result):
-            test_pubdir_path = path
+    if pubdir_path and should_pubdir_test(result):
+        dir_name = name
+        if _short_name_counts[short_name] > 1:
+            # test name is not unique, qualify it with its module/class path
+            dir_name = _qualified_test_name(item, name)
+
+        test_pubdir_path = generate_test_pubdir_path(
+            pubdir_path, dir_name, result, xdist_scope, xdist_worker
+        )
 
     data = TestResult(
         type="result",
@@ -135,9 +297,9 @@ def create_result(
         start_time=call.start,
         stop_time=call.stop,
         duration=call.duration,
-        stdout=report.capstdout,
-        stderr=report.capstderr,
-        log=report.caplog,
+        stdout=_cap_capture(report.capstdout, "stdout", test_pubdir_path),
+        stderr=_cap_capture(report.capstderr, "stderr", test_pubdir_path),
+        log=_cap_capture(report.caplog, "log", test_pubdir_path),
         xdist_dist=xdist_dist,
         xdist_worker=xdist_worker,
         xdist_scope=xdist_scope,
@@ -148,72 +310,140 @@ def create_result(
         data.excinfo = TestResult.ExcInfo(
             type=call.excinfo.type.__name__,
             value=str(call.excinfo.value),
-            traceback=traceback.format_tb(call.excinfo.tb),
+            traceback="".join(traceback.format_tb(call.excinfo.tb)),
         )
 
     return data
 
 
-def pubdir(result: TestResult):
-    if not result.pubdir_path:
-        return
+def _dumps(payload: dict, indent: bool = False) -> bytes:
+    try:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 if indent else None)
+    except orjson.JSONEncodeError:
+        # orjson rejects lone surrogates (e.g. surrogateescape'd bytes in captures)
+        return json.dumps(payload, indent=2 if indent else None).encode()
+
+
+def _header(title: str) -> str:
+    pad = 64 - len(title)
+    if pad <= 2:
+        return title
+    half = pad >> 1
+    return f"{'=' * (half + (pad & 1))} {title} {'=' * half}"
 
-    os.makedirs(result.pubdir_path, exist_ok=True)
 
-    # Textual file for test result
-    with open(os.path.join(result.pubdir_path, "brief.txt"), "w") as w:
+_HEADERS = {
+    title: _header(title)
+    for title in ("general test info", "exception", "stdout", "stderr", "log")
+}
 
-        def _print(str: str, file=None):
-            for f in [w] + ([] if not file else [file]):
-                print(str.rstrip(), file=f)
 
-        def _header(title) -> str:
-            width = 66 - len(title) - 2
-            if width <= 2:
-                return title
-            return (
-                ("=" * math.ceil(float(width) / 2))
-                + f" {title} "
-                + ("=" * math.floor(float(width) / 2))
+def pubdir(result: TestResult, payload: dict):
+    test_path = result.pubdir_path
+    if not test_path:
+        return
+
+    _make_result_dir(test_path)
+
+    # Textual file for test result, written at once along with the section files
+    brief: list[str] = []
+
+    def _print(text: str, filename: str | None = None):
+        brief.append(text.rstrip() + "\n")
+        if filename:
+            with open(
+                f"{test_path}{os.sep}{filename}", "w", errors="surrogateescape"
+            ) as w:
+                w.write(brief[-1])
+
+    _print(_HEADERS["general test info"])
+    _print(f"test: {result.nodeid}")
+    if result.xdist_scope:
+        _print(f"xdist-scope: {result.xdist_scope}")
+    _print(f"result: {result.result}")
+    _print(f"duration: {result.duration}s")
+    if result.xdist_worker:
+        _print(f"xdist-node: {result.xdist_worker}")
+    if result.xdist_dist and result.xdist_dist != "no":
+        _print(f"xdist-dist: {result.xdist_dist}")
+
+    if result.excinfo:
+        _print(_HEADERS["exception"])
+        exc = result.excinfo.type
+        if result.excinfo.value:
+            exc += f": {result.excinfo.value}"
+        _print(f"{result.excinfo.traceback.rstrip()}\n{exc}", "exception.txt")
+
+    if result.stdout:
+        _print(_HEADERS["stdout"])
+        _print(result.stdout, "stdout.txt")
+
+    if result.stderr:
+        _print(_HEADERS["stderr"])
+        _print(result.stderr, "stderr.txt")
+
+    if result.log:
+        _print(_HEADERS["log"])
+        _print(result.log, "log.txt")
+
+    with open(f"{test_path}{os.sep}brief.txt", "w", errors="surrogateescape") as w:
+        w.write("".join(brief))
+
+    with open(f"{test_path}{os.sep}result.json", "wb") as wb:
+        wb.write(_dumps(payload, indent=True))
+
+
+def _publish_worker(publish_url: str, compress: bool):
+    global _publish_error
+
+    headers = _GZIP_JSON_HEADERS if compress else _JSON_HEADERS
+    while True:
+        data = _queue.get()
+        if data is None:
+            return
+        try:
+            if compress:
+                data = gzip.compress(data, compresslevel=1)
+            _session.post(
+                publish_url, data=data, headers=headers, timeout=_PUBLISH_TIMEOUT
             )
+        except Exception as e:
+            # keep draining, the first error is raised when the session finishes
+            if _publish_error is None:
+                _publish_error = e
+
+
+def flush_publish():
+    global _last_flush
+
+    _last_flush = time.monotonic()
+    if not _pending:
+        return
+    data = b"[" + b",".join(_pending) + b"]"
+    _pending.clear()
+    _queue.put_nowait(data)
+
+
+def publish(payload: dict, batch: int):
+    if batch <= 1:
+        _queue.put_nowait(_dumps(payload))
+        return
+
+    _pending.append(_dumps(payload))
+    if (
+        len(_pending) >= batch
+        or time.monotonic() - _last_flush > _PUBLISH_FLUSH_INTERVAL
+    ):
+        flush_publish()
+
+
+@hookimpl(hookwrapper=True)
+def pytest_collection_modifyitems(items: list[Item]):
+    yield  # let other plugins (e.g. xdist loadgroup) rewrite nodeids first
 
-        _print(_header("general test info"))
-        _print(f"test: {result.nodeid}")
-        if result.xdist_scope:
-            _print(f"xdist-scope: {result.xdist_scope}")
-        _print(f"result: {result.result}")
-        _print(f"duration: {result.duration}s")
-        if result.xdist_worker:
-            _print(f"xdist-node: {result.xdist_worker}")
-        if result.xdist_dist and result.xdist_dist != "no":
-            _print(f"xdist-dist: {result.xdist_dist}")
-
-        if result.excinfo:
-            _print(_header("exception"))
-            with open(os.path.join(result.pubdir_path, "exception.txt"), "w") as w2:
-                _print("".join(result.excinfo.traceback), file=w2)
-                if result.excinfo.value:
-                    _print(f"{result.excinfo.type}: {result.excinfo.value}", file=w2)
-                else:
-                    _print(f"{result.excinfo.type}", file=w2)
-
-        if result.stdout:
-            _print(_header("stdout"))
-            with open(os.path.join(result.pubdir_path, "stdout.txt"), "w") as w2:
-                _print(result.stdout, file=w2)
-
-        if result.stderr:
-            _print(_header("stderr"))
-            with open(os.path.join(result.pubdir_path, "stderr.txt"), "w") as w2:
-                _print(result.stderr, file=w2)
-
-        if result.log:
-            _print(_header("log"))
-            with open(os.path.join(result.pubdir_path, "log.txt"), "w") as w2:
-                _print(result.log, file=w2)
-
-    with open(os.path.join(result.pubdir_path, "result.json"), "w") as w:
-        w.write(json.dumps(result.to_dict(), indent=4))  # type: ignore[attr-defined]
+    if _PUBDIR_PATH:
+        _short_name_counts.clear()
+        _short_name_counts.update(x.nodeid.split("::")[-1] for x in items)
 
 
 @hookimpl(hookwrapper=True)
@@ -223,18 +453,71 @@ def pytest_runtest_makereport(item: Item, call: CallInfo):
     if not call.when == "call":
         return
 
-    publish_url = item.config.getoption("publish")
-    pubdir_path = item.config.getoption("pubdir")
+    if not _PUBLISH_URL and not _PUBDIR_PATH:
+        return
 
-    if not publish_url and not pubdir_path:
+    # nothing to post, and the result is not written to pubdir either
+    outcome = get_result(call)
+    if not _PUBLISH_URL and not should_pubdir_test(outcome):
         return
 
-    result = create_result(item, call, report, pubdir_path)
+    result = create_result(item, call, report, outcome, _PUBDIR_PATH)
+
+    payload = result._to_payload()
+
+    pubdir(result, payload)
 
-    pubdir(result)
+    if _PUBLISH_URL:
+        publish(payload, _PUBLISH_BATCH)
+
+
+@hookimpl()
+def pytest_configure(config: Config):
+    global _PUBLISH_URL, _PUBLISH_BATCH, _PUBLISH_GZIP, _PUBDIR_PATH, _PUBDIR_FILTER
+    global _XDIST_WORKER, _XDIST_DIST, _thread, _last_flush
+
+    _PUBLISH_URL = config.getoption("publish")
+    _PUBLISH_BATCH = config.getoption("publish_batch")
+    _PUBLISH_GZIP = config.getoption("publish_gzip")
+    _PUBDIR_PATH = config.getoption("pubdir")
+    if _PUBDIR_PATH:
+        # user input, normalized once so pubdir paths can be built with os.sep
+        _PUBDIR_PATH = os.path.normpath(_PUBDIR_PATH)
+    _PUBDIR_FILTER = config.getoption("pubdir_filter")
+    _XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+    if _XDIST_WORKER:
+        _XDIST_DIST = config.workerinput["dist"]
+
+    if _PUBLISH_URL:
+        _last_flush = time.monotonic()
+        _thread = threading.Thread(
+            target=_publish_worker, args=(_PUBLISH_URL, _PUBLISH_GZIP), daemon=True
+        )
+        _thread.start()
+
+
+@hookimpl()
+def pytest_sessionfinish(session: Session):
+    global _thread
+
+    if _thread:
+        flush_publish()
+        _queue.put(None)
+        _thread.join(timeout=_PUBLISH_DRAIN_TIMEOUT)
+        if _thread.is_alive():
+            # the worker still owns the session, leave it open for the daemon
+            warnings.warn(
+                PytestWarning(
+                    f"--publish: some results were not posted within "
+                    f"{_PUBLISH_DRAIN_TIMEOUT}s of the session finishing"
+                )
+            )
+            return
+        _thread = None
+    _session.close()
 
-    if publish_url:
-        requests.post(publish_url, json=result.to_dict())  # type: ignore[attr-defined]
+    if _publish_error:
+        raise _publish_error
 
 
 @hookimpl(optionalhook=True)
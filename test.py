@@ -1,5 +1,8 @@
 import contextlib
+import gzip
+import json
 import logging
+import os
 import subprocess
 import sys
 import threading
@@ -19,7 +22,10 @@ def publish_mock_server(fn, port: int):
 
     @rest_app.route("/test-update", methods=["POST"])
     def test_update():
-        fn(request.json)
+        if request.content_encoding == "gzip":
+            fn(json.loads(gzip.decompress(request.get_data())))
+        else:
+            fn(request.json)
         return ""
 
     rest_thread.start()
@@ -115,8 +121,9 @@ def test_edgecase():
     assert fail["result"] == "fail"
     assert fail["excinfo"]["type"] == "AssertionError"
     assert fail["excinfo"]["value"] == "assert False"
-    assert "in _test_fail" in fail["excinfo"]["traceback"][-1]
-    assert "assert False" in fail["excinfo"]["traceback"][-1]
+    last_frame = fail["excinfo"]["traceback"].rpartition("  File ")[2]
+    assert "in _test_fail" in last_frame
+    assert "assert False" in last_frame
 
     assert skip["type"] == "result"
     assert skip["result"] == "skip"
@@ -140,6 +147,21 @@ def test_capture():
     assert "my doods" in res["log"]
 
 
+@pytest.mark.surrogate
+def _test_surrogate():
+    logging.warning("%s", b"\xff".decode("utf-8", "surrogateescape"))
+
+
+def test_surrogate():
+    datas = list()
+    run_tests("surrogate", lambda x: datas.append(x))
+    assert len(datas) == 1
+
+    res = datas[0]
+    assert res["result"] == "pass"
+    assert "\udcff" in res["log"]
+
+
 @pytest.mark.xdist
 @pytest.mark.parametrize("i", [str(x) for x in range(3)])
 def _test_xdist(i):
@@ -157,3 +179,168 @@ def test_xdist():
     assert res["nodeid"].startswith("test.py::_test_xdist[")
     assert res["xdist_worker"] in ["gw0", "gw1"]
     assert res["excinfo"] is None
+
+
+@pytest.mark.batch
+@pytest.mark.parametrize("i", [str(x) for x in range(3)])
+def _test_batch(i):
+    pass
+
+
+def test_batch():
+    datas = list()
+    run_tests("batch", lambda x: datas.append(x), "--publish-batch", "2")
+    assert all(isinstance(x, list) for x in datas)
+
+    results = [res for batch in datas for res in batch]
+    assert len(results) == 3
+    assert [res["nodeid"] for res in results] == [
+        f"test.py::_test_batch[{i}]" for i in range(3)
+    ]
+
+
+@pytest.mark.dupname
+class _TestDupA:
+    def _test_dup(self):
+        pass
+
+
+@pytest.mark.dupname
+class _TestDupB:
+    def _test_dup(self):
+        pass
+
+
+def test_dupname(tmp_path):
+    datas = list()
+    run_tests(
+        "dupname",
+        lambda x: datas.append(x),
+        "-o",
+        "python_classes=_Test*",
+        "--pubdir",
+        str(tmp_path),
+        "--pubdir-filter",
+        "all",
+    )
+    assert len(datas) == 2
+
+    a, b = datas
+    assert a["name"] == b["name"] == "_test_dup"
+    assert a["pubdir_path"] == str(
+        tmp_path / "test.py" / "_TestDupA" / "_test_dup" / "0.main.pass"
+    )
+    assert b["pubdir_path"] == str(
+        tmp_path / "test.py" / "_TestDupB" / "_test_dup" / "0.main.pass"
+    )
+
+
+@pytest.mark.gzip
+def _test_gzip():
+    print("compress me " * 100)
+
+
+def test_gzip():
+    datas = list()
+    run_tests("gzip", lambda x: datas.append(x), "--publish-gzip")
+    assert len(datas) == 1
+
+    res = datas[0]
+    assert res["nodeid"] == "test.py::_test_gzip"
+    assert res["stdout"] == "compress me " * 100 + "\n"
+
+
+@pytest.mark.bigcapture
+def _test_bigcapture():
+    print("x" * (100 * 1024))
+    assert False
+
+
+def test_bigcapture(tmp_path):
+    datas = list()
+    # the failure report would echo the capture and fill the subprocess pipe
+    run_tests(
+        "bigcapture",
+        lambda x: datas.append(x),
+        "--show-capture=no",
+        "--pubdir",
+        str(tmp_path),
+    )
+    assert len(datas) == 1
+
+    res = datas[0]
+    full_path = tmp_path / "_test_bigcapture" / "0.main.fail" / "stdout.full.txt"
+    stdout = "x" * (100 * 1024) + "\n"
+    assert res["stdout"] == stdout[-64 * 1024 :] + f"\n...[truncated; see {full_path}]"
+    assert full_path.read_text() == stdout
+
+
+@pytest.mark.loadgroup
+@pytest.mark.xdist_group("grp")
+def _test_loadgroup_grouped():
+    pass
+
+
+@pytest.mark.loadgroup
+def _test_loadgroup_ungrouped():
+    pass
+
+
+@pytest.mark.loadgroup
+@pytest.mark.parametrize("i", ["a@b"])
+def _test_loadgroup_param(i):
+    pass
+
+
+def test_loadgroup():
+    datas = list()
+    run_tests("loadgroup", lambda x: datas.append(x), "-n2", "--dist", "loadgroup")
+    assert len(datas) == 3
+
+    by_name = {res["name"]: res for res in datas}
+    assert by_name.keys() == {
+        "_test_loadgroup_grouped",
+        "_test_loadgroup_ungrouped",
+        "_test_loadgroup_param[a@b]",
+    }
+    assert by_name["_test_loadgroup_grouped"]["xdist_scope"] == "grp"
+
+
+def test_pubdir_rerun(tmp_path):
+    datas = list()
+    for _ in range(2):
+        run_tests(
+            "basic",
+            lambda x: datas.append(x),
+            "--pubdir",
+            f"{tmp_path}/",  # trailing separator must not leak into the paths
+            "--pubdir-filter",
+            "all",
+        )
+    assert [res["pubdir_path"] for res in datas] == [
+        str(tmp_path / "_test_basic" / "0.main.pass"),
+        str(tmp_path / "_test_basic" / "1.main.pass"),
+    ]
+
+
+@pytest.mark.filtered
+def _test_filtered():
+    assert os.environ.get("FILTERED_RESULT") != "fail"
+
+
+def test_pubdir_filtered(tmp_path, monkeypatch):
+    datas = list()
+    pubdir_args = ["--pubdir", str(tmp_path), "--pubdir-filter", "bad"]
+
+    monkeypatch.setenv("FILTERED_RESULT", "pass")
+    run_tests("filtered", lambda x: datas.append(x), *pubdir_args)
+    assert datas[-1]["result"] == "pass"
+    assert datas[-1]["pubdir_path"] is None
+    assert not (tmp_path / "_test_filtered").exists()
+
+    monkeypatch.setenv("FILTERED_RESULT", "fail")
+    run_tests("filtered", lambda x: datas.append(x), *pubdir_args)
+    fail_path = tmp_path / "_test_filtered" / "0.main.fail"
+    assert datas[-1]["result"] == "fail"
+    assert datas[-1]["pubdir_path"] == str(fail_path)
+    assert [x.name for x in (tmp_path / "_test_filtered").iterdir()] == ["0.main.fail"]